@@ -1,8 +1,19 @@
-import socket, ssl, sys, time, gzip, zlib
+import asyncio, re, select, socket, ssl, sys, time, zlib
+from collections import OrderedDict, deque
+from functools import lru_cache
 from io import BytesIO
-from urllib.parse import unquote, urlsplit, urlunsplit
+from urllib.parse import unquote, urljoin, urlsplit, urlunsplit
 
 DEFAULT_USER_AGENT = "TinyBrowser/0.1"
+READ_BUFFER_SIZE = 64 * 1024
+DECOMPRESS_CHUNK_SIZE = 32 * 1024
+DNS_TTL = 60
+SOCKET_TIMEOUT = 6
+
+# building a context parses the whole system CA bundle, so do it once
+_SSL_CTX = ssl.create_default_context()
+# key: (host, port) -> (sockaddr, expires_at)
+_DNS_CACHE = {}
 
 
 # -------------------------
@@ -12,8 +23,60 @@ DEFAULT_USER_AGENT = "TinyBrowser/0.1"
 def now():
     return time.time()
 
+# matches what the old char loop dropped: tags (even unterminated) and stray '>'
+_TAG_RE = re.compile(r"<[^>]*>?|>")
+# same on raw UTF-8: '<' and '>' never occur inside a multi-byte sequence
+_TAG_BYTES_RE = re.compile(rb"<[^>]*>?|>")
+_ENTITY_RE = re.compile(r"&(lt|gt|amp|quot|#[0-9]+|#[xX][0-9a-fA-F]+);")
+_ENTITIES = {"lt": "<", "gt": ">", "amp": "&", "quot": '"'}
+_KEEP_ALIVE_TIMEOUT_RE = re.compile(r"timeout=(\d+)")
+_MAX_AGE_RE = re.compile(r"\bmax-age=(\d+)")
+_HEAD_END_RE = re.compile(rb"\r?\n\r?\n")
+
+def _entity(m) -> str:
+    # same rules as render_engine.utils, so _show_text and lex() agree
+    name = m.group(1)
+    if name[0] != "#":
+        return _ENTITIES[name]
+    try:
+        cp = int(name[2:], 16) if name[1] in "xX" else int(name[1:])
+    except ValueError:
+        return "\ufffd"
+    # like HTML: NUL, surrogates and out-of-range code points become U+FFFD
+    if cp == 0 or 0xD800 <= cp <= 0xDFFF or cp > 0x10FFFF:
+        return "\ufffd"
+    return chr(cp)
+
 def decode_entities(text:str) -> str :
-    return text.replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
+    # single scan; replacements are never re-scanned, so "&amp;lt;" -> "&lt;"
+    return _ENTITY_RE.sub(_entity, text)
+
+def resolve(host, port):
+    """getaddrinfo() with a short-lived cache; returns an IPv4 sockaddr."""
+    key = (host, port)
+    entry = _DNS_CACHE.get(key)
+    if entry and now() < entry[1]:
+        return entry[0]
+    infos = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM)
+    addr = infos[0][4]
+    _DNS_CACHE[key] = (addr, now() + DNS_TTL)
+    return addr
+
+@lru_cache(maxsize=128)
+def request_template(host):
+    """GET request bytes for host with a {PATH} placeholder, built once per host."""
+    # Build request (HTTP/1.1)
+    headers = {
+        "Host": host,
+        "Connection": "keep-alive",     
+        "User-Agent": DEFAULT_USER_AGENT,
+        "Accept-Encoding": "gzip",       
+    }
+    request_lines = ["GET {PATH} HTTP/1.1"]
+    for k,v in headers.items():
+        request_lines.append(f"{k}: {v}")
+    request_lines.append("")  # blank line
+    return ("\r\n".join(request_lines) + "\r\n").encode("utf8")
 
 # --------------------------------
 # Connection pool for keep-alive 
@@ -21,28 +84,54 @@ def decode_entities(text:str) -> str :
 
 
 class ConnectionPool:
-    def __init__(self):
-        # key: (scheme, host, port) -> (socket, last_used_time)
+    def __init__(self, idle_timeout=30, max_per_host=8):
+        # key: (scheme, host, port) -> deque of (socket, expires_at)
         self.pool ={}
+        self.idle_timeout = idle_timeout
+        self.max_per_host = max_per_host
 
     def get(self, scheme, host, port):
+        """Check out an idle socket, discarding any that expired or were closed by the peer."""
         key = (scheme, host, port)
-        entry = self.pool.get(key)
-        if entry:
-            s, t = entry
-            return s
+        entries = self.pool.get(key)
+        while entries:
+            # most recently returned first: the least likely to have gone stale
+            s, expires = entries.pop()
+            if now() < expires and self._is_alive(s):
+                return s
+            s.close()
         return None
     
-    def set(self, scheme, host, port, sock):
+    def set(self, scheme, host, port, sock, keep_alive_timeout=None):
         key = (scheme, host, port)
-        self.pool[key] = (sock, now())
+        timeout = self.idle_timeout
+        if keep_alive_timeout is not None:
+            # server announced when it will drop the connection (Keep-Alive: timeout=N)
+            timeout = min(timeout, keep_alive_timeout)
+        entries = self.pool.setdefault(key, deque())
+        entries.append((sock, now() + timeout))
+        while len(entries) > self.max_per_host:
+            s, _ = entries.popleft()
+            s.close()
+
+    @staticmethod
+    def _is_alive(sock):
+        try:
+            if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) != 0:
+                return False
+            # an idle keep-alive socket has nothing to read; readable means EOF or junk
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
 
     def close_all(self):
-        for (s,_) in self.pool.values():
-            try:
-                s.close()
-            except:
-                pass
+        for entries in self.pool.values():
+            for (s,_) in entries:
+                try:
+                    s.close()
+                except:
+                    pass
         self.pool.clear()
 
 # -------------------------
@@ -50,45 +139,178 @@ class ConnectionPool:
 # -------------------------
 
 class SimpleCache:
-    def __init__(self):
+    def __init__(self, max_entries=256, sweep_every=64, default_max_age=300):
             # key: url -> (body_bytes, stored_time, max_age_seconds or None)
-            self.store = {}
+            # ordered oldest -> most recently used, so eviction pops from the front
+            self.store = OrderedDict()
+            self.max_entries = max_entries
+            # TTL for responses without max-age, so they age out instead of living forever
+            self.default_max_age = default_max_age
+            self.sweep_every = sweep_every
+            self._sets_since_sweep = 0
 
     def get(self, url):
         v = self.store.get(url)
         if not v:
             return None
         body, stored, max_age = v
-        if max_age is None:
+        if max_age is None or (now() - stored) <= max_age:
+            self.store.move_to_end(url)
             return body
-        if (now() - stored) <= max_age:
-                return body
         else:
             # expired
             del self.store[url]
             return None
         
     def set(self, url, body, max_age):
-        # if max_age is None means store indefinitely
+        # if max_age is None fall back to default_max_age (None there means until evicted)
+        if max_age is None:
+            max_age = self.default_max_age
         self.store[url] = (body, now(), max_age)
+        self.store.move_to_end(url)
+        while len(self.store) > self.max_entries:
+            self.store.popitem(last=False)
+        self._sets_since_sweep += 1
+        if self._sets_since_sweep >= self.sweep_every:
+            self._sets_since_sweep = 0
+            self.sweep()
+
+    def sweep(self):
+        """Drop expired entries that were never looked up again."""
+        t = now()
+        expired = [
+            url for url, (_, stored, max_age) in self.store.items()
+            if max_age is not None and (t - stored) > max_age
+        ]
+        for url in expired:
+            del self.store[url]
         
 # --------------------------------------
 # HTTP helpers: chunked decode, readexact
 # ---------------------------------------
 
-def read_exact(rfile, n):
-    """Read exactly n bytes from file-like binary rfile."""
-    chunks =[]
+def read_exact(rfile, n, dst):
+    """Copy exactly n bytes from file-like binary rfile into dst (fewer only on EOF).
+
+    dst is a writable binary file (e.g. BytesIO); the bytes are written
+    straight into it as they arrive and the count read is returned.
+    """
+    # one reusable scratch buffer instead of a fresh bytes object per read
+    view = memoryview(bytearray(min(n, READ_BUFFER_SIZE)))
     remaining = n
     while remaining > 0:
-        piece = rfile.read(remaining)
+        got = rfile.readinto(view[:remaining])
+        if not got:
+            break
+        dst.write(view[:got])
+        remaining -= got
+    return n - remaining
+
+def read_head(rfile):
+    """Read the status line and headers, up to and including the blank line.
+
+    Scans the reader's buffer with peek() so the whole block is found in a
+    few C-level searches, and consumes nothing past it (the body stays buffered).
+    """
+    head = bytearray()
+    while True:
+        chunk = rfile.peek(READ_BUFFER_SIZE)
+        if not chunk:
+            return bytes(head)
+        start = len(head)
+        head += chunk
+        # the terminator may straddle the previous buffer
+        m = _HEAD_END_RE.search(head, max(0, start - 3))
+        if m:
+            rfile.read(m.end() - start)
+            return bytes(head[:m.end()])
+        rfile.read(len(chunk))
+
+def read_until_eof(rfile, dst):
+    """Copy everything left in rfile into dst."""
+    while True:
+        piece = rfile.read1(READ_BUFFER_SIZE)
         if not piece:
             break
-        chunks.append(piece)
-        remaining -= len(piece)
-    return b"".join(chunks)
+        dst.write(piece)
+
+
+class StreamingDecoder:
+    """Binary sink that inflates gzip/deflate data as it is written.
+
+    Used as the dst of the body readers so decompression overlaps the
+    network reads instead of running over a fully buffered body. Like the
+    old gzip.decompress fallback, data that turns out not to be compressed
+    at all is passed through unchanged.
+    """
+
+    def __init__(self, encoding):
+        # deflate is meant to be zlib-wrapped, but some servers send it raw
+        self._gzip = encoding == "gzip"
+        if self._gzip:
+            self._wbits = [16 + zlib.MAX_WBITS]
+        else:
+            self._wbits = [zlib.MAX_WBITS, -zlib.MAX_WBITS]
+        self._decomp = zlib.decompressobj(self._wbits.pop(0))
+        self._head = b""     # input kept until the first output, to allow a retry
+        self._passthrough = False
+        self._broken = False
+        self.out = BytesIO()
+
+    def write(self, data):
+        if self._passthrough:
+            self.out.write(data)
+        elif not self._broken:
+            if self._head is not None:
+                self._head += data
+            try:
+                self._inflate(data)
+            except zlib.error:
+                self._recover()
+        return len(data)
+
+    def _inflate(self, data):
+        # bounded output steps keep each intermediate buffer small
+        while data:
+            out = self._decomp.decompress(data, DECOMPRESS_CHUNK_SIZE)
+            if out:
+                self._head = None
+                self.out.write(out)
+            if not self._decomp.eof:
+                data = self._decomp.unconsumed_tail
+                continue
+            # end of stream: with max_length set, the bytes after it sit in
+            # unconsumed_tail as well as unused_data, so don't loop on them
+            data = self._decomp.unused_data
+            if not (data and self._gzip):
+                break
+            # concatenated gzip members (gzip.decompress accepts them): start the next one
+            self._decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def _recover(self):
+        if self._head is None:
+            # corrupt after some output: keep what decoded, drop the rest
+            self._broken = True
+            return
+        head, self._head = self._head, b""
+        if self._wbits:
+            self._decomp = zlib.decompressobj(self._wbits.pop(0))
+            self.write(head)
+        else:
+            self._passthrough = True
+            self.out.write(head)
+
+    def getvalue(self):
+        if not (self._passthrough or self._broken):
+            try:
+                self.out.write(self._decomp.flush())
+            except zlib.error:
+                pass
+            self._passthrough = True   # flushed; write nothing more through zlib
+        return self.out.getvalue()
+
 
-def decode_chunked(rfile):
+def decode_chunked(rfile, body=None):
     """Decode HTTP chunked transfer from binary file-like rfile.
     Ex: 
         4\r\n -> byte size
@@ -100,20 +322,22 @@ def decode_chunked(rfile):
         0\r\n
         \r\n
 
+    Decoded bytes go to body (a BytesIO or StreamingDecoder) when given.
     """
 
-    body = BytesIO()
+    if body is None:
+        body = BytesIO()
 
     while True:
          # chunk-size line
         line = rfile.readline()
         if not line:
             break
-        line = line.strip()
         # ignore chunk extensions after ';'
         if b';' in line:
             line = line.split(b';',1)[0]
         try:
+            # int() skips the surrounding whitespace / trailing CRLF itself
             size = int(line, 16)
         except:
             raise RuntimeError(f"Bad chunk size: {line!r}")
@@ -124,8 +348,7 @@ def decode_chunked(rfile):
                 if not l or l in (b'\r\n', b'\n', b''):
                     break
             break
-        data = read_exact(rfile, size)
-        body.write(data)
+        read_exact(rfile, size, dst=body)
         # consume CRLF after chunk  ( removes the trailing \r\n)
         rfile.read(2)
     return body.getvalue()
@@ -133,16 +356,161 @@ def decode_chunked(rfile):
 
 
 
+def split_http_url(raw_url):
+    """-> (scheme, host, port, path-with-query) for an http(s) URL."""
+    parsed = urlsplit(raw_url)
+    scheme = parsed.scheme
+    host = parsed.hostname
+    port = parsed.port or (443 if scheme=="https" else 80)
+    path = parsed.path or "/"
+    if parsed.query:
+        path += "?" + parsed.query
+    return scheme, host, port, path
+
+def parse_head(head):
+    """Parse a raw status line + header block -> (status_code, headers) or None."""
+    # status line + headers in one block. Split the bytes on b"\n", as readline()
+    # did, before decoding: str.splitlines() would also break on \x85, \x1c-\x1e...
+    # which raw UTF-8 in a header value decodes to. Trailing \r goes with strip().
+    lines = [line.decode("iso-8859-1") for line in head.split(b"\n")]
+    status_line = lines[0].strip() if lines else ""
+    if not status_line:
+        print("[error] empty response")
+        return None
+    parts = status_line.split(" ",2)
+    if len(parts) < 2:
+        print(f"[error] bad status line: {status_line}")
+        return None
+    try:
+        status_code = int(parts[1])
+    except:
+        status_code = 0
+    # read headers
+    headers_out = {}
+    for line in lines[1:]:
+        if ":" not in line:
+            continue
+        name, val = line.split(":",1)
+        headers_out[name.strip().lower()] = val.strip()
+    return status_code, headers_out
+
+def body_sink(headers):
+    """Where to write the body: inflates while reading for gzip/deflate."""
+    cenc = headers.get("content-encoding","").lower()
+    if cenc in ("gzip", "deflate"):
+        return StreamingDecoder(cenc)
+    return BytesIO()
+
+def server_closes(headers):
+    """True if the server will close the connection after this response."""
+    server_conn = headers.get("connection","").lower()
+    return server_conn == "close" or headers.get("proxy-connection","").lower() == "close"
+
+def keep_alive_timeout(headers):
+    """Seconds the server keeps an idle connection (Keep-Alive: timeout=N), or None."""
+    m = _KEEP_ALIVE_TIMEOUT_RE.search(headers.get("keep-alive", ""))
+    return int(m.group(1)) if m else None
+
+def read_timeout(aw):
+    """Bound one StreamReader read, like settimeout(SOCKET_TIMEOUT) does for the sync path."""
+    return asyncio.wait_for(aw, SOCKET_TIMEOUT)
+
+
+async def read_exact_async(reader, n, dst):
+    """Copy exactly n bytes into dst, one buffer at a time so the timeout is per read, not per body."""
+    while n > 0:
+        piece = await read_timeout(reader.readexactly(min(n, READ_BUFFER_SIZE)))
+        dst.write(piece)
+        n -= len(piece)
+
+
+async def read_until_eof_async(reader, dst):
+    """read_until_eof() for an asyncio.StreamReader, with the timeout per read."""
+    while True:
+        piece = await read_timeout(reader.read(READ_BUFFER_SIZE))
+        if not piece:
+            break
+        dst.write(piece)
+
+
+async def decode_chunked_async(reader, body):
+    """decode_chunked() for an asyncio.StreamReader."""
+    while True:
+        line = await read_timeout(reader.readline())
+        if not line:
+            break
+        if b';' in line:
+            line = line.split(b';',1)[0]
+        try:
+            size = int(line, 16)
+        except:
+            raise RuntimeError(f"Bad chunk size: {line!r}")
+        if size == 0:
+            while True:
+                l = await read_timeout(reader.readline())
+                if not l or l in (b'\r\n', b'\n'):
+                    break
+            break
+        await read_exact_async(reader, size, body)
+        await read_timeout(reader.readexactly(2))
+    return body.getvalue()
+
+
+class AsyncConnectionPool:
+    """Idle (reader, writer) pairs for keep-alive, valid within one event loop."""
+
+    def __init__(self, max_per_host=8):
+        # key: (scheme, host, port) -> asyncio.Queue of (reader, writer)
+        self.pool = {}
+        self.max_per_host = max_per_host
+
+    def _queue(self, key):
+        q = self.pool.get(key)
+        if q is None:
+            q = self.pool[key] = asyncio.Queue(self.max_per_host)
+        return q
+
+    def get(self, scheme, host, port):
+        q = self._queue((scheme, host, port))
+        while not q.empty():
+            reader, writer = q.get_nowait()
+            if not (reader.at_eof() or writer.is_closing()):
+                return reader, writer
+            writer.close()
+        return None
+
+    def set(self, scheme, host, port, conn):
+        try:
+            self._queue((scheme, host, port)).put_nowait(conn)
+        except asyncio.QueueFull:
+            conn[1].close()
+
+    async def close_all(self):
+        for q in self.pool.values():
+            while not q.empty():
+                _, writer = q.get_nowait()
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except:
+                    pass
+        self.pool.clear()
+
+
 #scheme://host/path
 #     Scheme  Hostname    path
 # Ex: http://example.org/index.html
 
 class URL:
 
+    # shared by every URL so keep-alive and caching help across URL(...) instances
+    _pool = ConnectionPool()
+    _cache = SimpleCache()
+
     def __init__(self, raw_url=None):
          
-        self.conn_pool = ConnectionPool()
-        self.cache = SimpleCache()
+        self.conn_pool = URL._pool
+        self.cache = URL._cache
         self.default_file_on_no_url = "test.html"
         self.max_redirects = 10
         self.raw_url = raw_url
@@ -150,10 +518,17 @@ class URL:
         
 
 
+    @classmethod
+    def shutdown(cls):
+        """Close every pooled connection; call once on program exit."""
+        cls._pool.close_all()
+
     # ---------------------
     # Public: load (entry)
     # ---------------------      
-    def fetch(self):
+    def fetch(self, decode=True):
+        """Fetch and show the URL. decode=False returns the raw body bytes instead
+        (nothing printed), for callers like the renderer that lex bytes directly."""
         if self.raw_url is None:
             self.raw_url = "file:///" + self.default_file_on_no_url
             print(f"[info] No URL given. Opening {self.raw_url}")
@@ -168,17 +543,21 @@ class URL:
         scheme = self.raw_url.split(":",1)[0].lower()
         if scheme == "file":
             body = self._handle_file_url(self.raw_url)
+            if not decode:
+                return body
             if view_source_mode:
                   self._show_raw_bytes(body)
             else:
-                self._show_text(body.decode("utf8", errors="replace"))
+                self._show_text(body)
             return
         if scheme == "data":
             body = self._handle_data_url(self.raw_url)
+            if not decode:
+                return body
             if view_source_mode:
                 self._show_raw_bytes(body)
             else:
-                self._show_text(body.decode("utf8", errors="replace"))
+                self._show_text(body)
             return
         # http/https
         # Follow redirects with limit
@@ -194,11 +573,12 @@ class URL:
             cached_body = self.cache.get(url_to_fetch)
             if cached_body is not None:
                 print(f"[cache] HIT for {url_to_fetch}")
+                if not decode:
+                    return cached_body
                 if view_source_mode:
                     self._show_raw_bytes(cached_body)
-                else:
-                  response_content=  self._show_text(cached_body.decode("utf8", errors="replace"),tag_strip=False)
-                return response_content
+                    return cached_body
+                return self._show_text(cached_body,tag_strip=False)
             resp = self._http_request(url_to_fetch)
             if resp is None:
                 return
@@ -210,42 +590,150 @@ class URL:
                     print("[error] redirect with no Location")
                     return
                 # resolve relative location
-                from urllib.parse import urljoin
                 url_to_fetch = urljoin(url_to_fetch, loc)
                 print(f"[redirect] {status_code} -> {url_to_fetch}")
                 redirects += 1
                 continue
-            # cache if allowed: GET & 200
-            # parse Cache-Control header
-            cc = headers.get("cache-control", "")
-            # simple parsing: look for no-store, look for max-age=N
-            if status_code == 200:
-                if "no-store" in cc:
-                    pass  # do not cache
-                else:
-                    max_age = None
-                    if "max-age" in cc:
-                        try:
-                            # find max-age
-                            parts = [p.strip() for p in cc.split(',')]
-                            for p in parts:
-                                if p.startswith("max-age"):
-                                    _, val = p.split("=",1)
-                                    max_age = int(val)
-                        except:
-                            max_age = None
-                    self.cache.set(url_to_fetch, body, max_age)
+            self._cache_response(url_to_fetch, status_code, headers, body)
+            if not decode:
+                return body
                  # finally display
             if view_source_mode:
+                # raw bytes go straight out; no decode pass
                 self._show_raw_bytes(body)
-            else:
-                # body is bytes. decode and render
-                text = body.decode("utf8", errors="replace")
-                response_content = self._show_text(text, tag_strip=False)
-            return response_content
+                return body
+            # body is bytes; _show_text decodes it once
+            return self._show_text(body, tag_strip=False)
             
 
         
+    def _cache_response(self, url, status_code, headers, body):
+        # cache if allowed: GET & 200
+        # parse Cache-Control header
+        cc = headers.get("cache-control", "")
+        # simple parsing: look for no-store, look for max-age=N
+        if status_code == 200:
+            if "no-store" in cc:
+                pass  # do not cache
+            else:
+                m = _MAX_AGE_RE.search(cc)
+                max_age = int(m.group(1)) if m else None
+                self.cache.set(url, body, max_age)
+
+    # ---------------------
+    # Concurrent fetches (e.g. subresources)
+    # ---------------------
+    def fetch_many(self, urls):
+        """Fetch several http(s) URLs concurrently; returns their bodies in order (None on failure).
+
+        Unlike fetch() this does not render anything. Redirects and the
+        shared cache are handled the same way.
+        """
+        return asyncio.run(self._fetch_many(urls))
+
+    async def _fetch_many(self, urls):
+        pool = AsyncConnectionPool()
+        try:
+            return await asyncio.gather(*(self.fetch_async(u, pool) for u in urls))
+        finally:
+            await pool.close_all()
+
+    async def fetch_async(self, url_to_fetch, pool):
+        redirects = 0
+        while redirects <= self.max_redirects:
+            cached_body = self.cache.get(url_to_fetch)
+            if cached_body is not None:
+                return cached_body
+            resp = await self._http_request_async(url_to_fetch, pool)
+            if resp is None:
+                return None
+            status_code, headers, body = resp
+            if 300 <= status_code < 400:
+                loc = headers.get("location")
+                if not loc:
+                    print("[error] redirect with no Location")
+                    return None
+                url_to_fetch = urljoin(url_to_fetch, loc)
+                redirects += 1
+                continue
+            self._cache_response(url_to_fetch, status_code, headers, body)
+            return body
+        print("[error] Too many redirects")
+        return None
+
+    async def _http_request_async(self, raw_url, pool):
+        scheme, host, port, path = split_http_url(raw_url)
+        if not host:
+            print(f"[error] no host in URL: {raw_url}")
+            return None
+        request_raw = request_template(host).replace(b"{PATH}", path.encode("utf8"))
+        conn = pool.get(scheme, host, port)
+        reused = conn is not None
+        while True:
+            if conn is None:
+                try:
+                    conn = await asyncio.wait_for(asyncio.open_connection(
+                        host, port, limit=READ_BUFFER_SIZE,
+                        ssl=_SSL_CTX if scheme == "https" else None,
+                        server_hostname=host if scheme == "https" else None,
+                    ), SOCKET_TIMEOUT)
+                except (OSError, asyncio.TimeoutError) as e:
+                    print(f"[error] connect failed: {e}")
+                    return None
+            reader, writer = conn
+            try:
+                writer.write(request_raw)
+                await writer.drain()
+                head = await read_timeout(reader.readuntil(b"\r\n\r\n"))
+                break
+            except (asyncio.TimeoutError, asyncio.LimitOverrunError) as e:
+                # peer never answered, or a head bigger than the read buffer
+                writer.close()
+                print(f"[error] bad response head from {host}: {e!r}")
+                return None
+            except (OSError, asyncio.IncompleteReadError):
+                writer.close()
+                if not reused:
+                    print("[error] empty response")
+                    return None
+                # a pooled connection the server already dropped; retry once on a fresh one
+                conn, reused = None, False
+
+        head = parse_head(head)
+        if head is None:
+            writer.close()
+            return None
+        status_code, headers_out = head
+        sink = body_sink(headers_out)
+        try:
+            if headers_out.get("transfer-encoding","").lower() == "chunked":
+                body = await decode_chunked_async(reader, sink)
+            else:
+                try:
+                    clen = int(headers_out["content-length"])
+                except (KeyError, ValueError):
+                    # read until socket EOF (server will close if Connection: close)
+                    await read_until_eof_async(reader, sink)
+                else:
+                    await read_exact_async(reader, clen, sink)
+                body = sink.getvalue()
+        except asyncio.IncompleteReadError as e:
+            # connection dropped mid-body: keep what arrived, like the sync readers do
+            sink.write(e.partial)
+            body = sink.getvalue()
+            headers_out["connection"] = "close"
+        except (asyncio.TimeoutError, asyncio.LimitOverrunError, RuntimeError, OSError) as e:
+            # stalled or malformed body (e.g. a bad chunk size): fail this URL only
+            writer.close()
+            print(f"[error] bad response body from {host}: {e!r}")
+            return None
+
+        if server_closes(headers_out):
+            writer.close()
+        else:
+            pool.set(scheme, host, port, conn)
+        return status_code, headers_out, body
+
     # ---------------------
     # File URL
     # ---------------------
@@ -297,13 +785,11 @@ class URL:
     # HTTP request: returns (status_code:int, headers:dict, body:bytes)
     # ---------------------
     def _http_request(self, raw_url):
-        parsed = urlsplit(raw_url)
-        scheme = parsed.scheme
-        host = parsed.hostname
-        port = parsed.port or (443 if scheme=="https" else 80)
-        path = parsed.path or "/"
-        if parsed.query:
-            path += "?" + parsed.query
+        scheme, host, port, path = split_http_url(raw_url)
+        if not host:
+            # getaddrinfo(None, ...) would quietly resolve to localhost
+            print(f"[error] no host in URL: {raw_url}")
+            return None
         
         # try reuse connection
         sock = None
@@ -318,93 +804,48 @@ class URL:
                 return
             created_new = True
 
-         # Build request (HTTP/1.1)
-        headers = {
-            "Host": host,
-            "Connection": "keep-alive",     
-            "User-Agent": DEFAULT_USER_AGENT,
-            "Accept-Encoding": "gzip",       
-        }
-        request_lines = [f"GET {path} HTTP/1.1"]
-        for k,v in headers.items():
-            request_lines.append(f"{k}: {v}")
-        request_lines.append("")  # blank line
-        request_raw = "\r\n".join(request_lines) + "\r\n"
+        request_raw = request_template(host).replace(b"{PATH}", path.encode("utf8"))
         try:
-             sock.sendall(request_raw.encode("utf8"))
+             sock.sendall(request_raw)
         except Exception as e:
-            # socket may have gone stale; try create a new one once
-            try:
-                sock.close()
-            except: pass
+            # the peer may still close between the pool check and our send; retry once
+            sock.close()
             sock = self.create_socket(scheme,host,port)
             if sock is None:
                 return
-            sock.sendall(request_raw.encode("utf8"))
-
-        # read response using file-like in binary mode (important for bytes)
-        rfile = sock.makefile("rb", buffering=0)
-         # read status line
-        status_line = rfile.readline().decode("iso-8859-1").strip()
-        if not status_line:
-            print("[error] empty response")
-            return None
-        parts = status_line.split(" ",2)
-        if len(parts) < 2:
-            print(f"[error] bad status line: {status_line}")
+            sock.sendall(request_raw)
+
+        # read response using file-like in binary mode (important for bytes);
+        # buffered so readline() does one recv per buffer instead of one per byte
+        rfile = sock.makefile("rb", buffering=READ_BUFFER_SIZE)
+        head = parse_head(read_head(rfile))
+        if head is None:
             return None
-        try:
-            status_code = int(parts[1])
-        except:
-            status_code = 0
-        # read headers
-        headers_out = {}
-        while True:
-            line = rfile.readline().decode("iso-8859-1")
-            if line in ("\r\n", "\n", ""):
-                break
-            if ":" not in line:
-                continue
-            name, val = line.split(":",1)
-            headers_out[name.strip().lower()] = val.strip()
+        status_code, headers_out = head
 
+        # Content-Encoding handling: inflate while reading (gzip/deflate)
+        sink = body_sink(headers_out)
 
-        # Transfer-Encoding / Content-Encoding handling
+        # Transfer-Encoding handling
         if headers_out.get("transfer-encoding","").lower() == "chunked":
-            body = decode_chunked(rfile)
+            body = decode_chunked(rfile, sink)
         else:
             # if content-length present, read exact bytes
             if "content-length" in headers_out:
                 try:
                     clen = int(headers_out["content-length"])
-                    body = read_exact(rfile, clen)
-                except:
-                    body = rfile.read()
+                except ValueError:
+                    read_until_eof(rfile, sink)
+                else:
+                    read_exact(rfile, clen, dst=sink)
             else:
                 # no content-length and not chunked:
                 # read until socket EOF (server will close if Connection: close)
-                body = rfile.read()
-
-
-        # Handle gzip content-encoding
-        cenc = headers_out.get("content-encoding","").lower()
-        if cenc == "gzip":
-            try:
-                body = gzip.decompress(body)
-            except:
-                try:
-                    body = zlib.decompress(body, 16+zlib.MAX_WBITS)
-                except:
-                    pass
-        elif cenc == "deflate":
-            try:
-                body = zlib.decompress(body)
-            except:
-                pass
+                read_until_eof(rfile, sink)
+            body = sink.getvalue()
         
         # Manage connection reuse: if server wants close, close socket; else keep
-        server_conn = headers_out.get("connection","").lower()
-        if server_conn == "close" or headers_out.get("proxy-connection","").lower() == "close":
+        if server_closes(headers_out):
             try:
                 sock.close()
             except:
@@ -413,7 +854,7 @@ class URL:
             # (pool will only hold sockets we set)
         else:
             # keep socket in pool for reuse
-            self.conn_pool.set(scheme, host, port, sock)
+            self.conn_pool.set(scheme, host, port, sock, keep_alive_timeout(headers_out))
 
 
         return status_code, headers_out, body
@@ -422,44 +863,45 @@ class URL:
     def create_socket(self,scheme,host,port):
 
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
-        sock.settimeout(6)
+        sock.settimeout(SOCKET_TIMEOUT)
         try:
-            sock.connect((host, port))
+            sock.connect(resolve(host, port))
         except Exception as e:
                 print(f"[error] connect failed: {e}")
                 return None
         if scheme == "https":
-                ctx = ssl.create_default_context()
-                sock = ctx.wrap_socket(sock, server_hostname=host)
+                sock = _SSL_CTX.wrap_socket(sock, server_hostname=host)
         return sock
     
     # ---------------------
     # Output helpers: show raw bytes or "rendered" (strip tags + decode entities)
     # ---------------------
     def _show_raw_bytes(self, bts: bytes):
+        out = getattr(sys.stdout, "buffer", None)
+        if out is not None:
+            # write the bytes as-is instead of decoding the whole body just to print it
+            sys.stdout.flush()
+            out.write(bts)
+            out.write(b"\n")
+            out.flush()
+            return
         try:
             txt = bts.decode("utf8", errors="replace")
         except:
             txt = str(bts)
         print(txt)
     
-    def _show_text(self, text: str, tag_strip: bool = True) -> str:
+    def _show_text(self, text: "str | bytes", tag_strip: bool = True) -> str:
+        """Accepts the body as bytes (decoded here, once) or an already decoded str."""
+        is_bytes = isinstance(text, (bytes, bytearray))
         if not tag_strip : 
-            return text
+            return text.decode("utf8", errors="replace") if is_bytes else text
         # very small HTML text-only renderer: strip tags and decode entities 
-        out = []
-        in_tag = False
-        i = 0
-        while i < len(text):
-            c = text[i]
-            if c == "<":
-                in_tag = True
-            elif c == ">":
-                in_tag = False
-            elif not in_tag:
-                out.append(c)
-            i += 1
-        rendered = "".join(out)
+        if is_bytes:
+            # strip before decoding so only the visible text goes through the decoder
+            rendered = _TAG_BYTES_RE.sub(b"", text).decode("utf8", errors="replace")
+        else:
+            rendered = _TAG_RE.sub("", text)
         rendered = decode_entities(rendered)
         
         return rendered
@@ -488,15 +930,14 @@ def main():
  
 
     """
-    b = URL()
     if len(sys.argv) < 2:
         url = None
     else:
         url = sys.argv[1]
     try:
-        b.fetch(url)
+        URL(url).fetch()
     finally:
-        b.conn_pool.close_all()
+        URL.shutdown()
 
 if __name__ == "__main__":
     main()
@@ -1,19 +1,35 @@
-
+from array import array
 from dataclasses import dataclass
+import re
 import tkinter.font
 from .utils import decode_entities
 
 HSTEP = 10 
 VSTEP = 20 
 WIDTH, HEIGHT = 800, 600
+DEBUG = False
+
+# one token per match: a tag (group 1 = "/" for closing tags, group 2 = name)
+# or a run of text (group 3)
+_TOK_RE = re.compile(r"<(/?)([^>]*)>|([^<]+)")
 
 
 class Text:
+    # one of these per text run: slots keep them small
+    __slots__ = ("text", "parent", "children", "_words")
 
-    def __init__(self, text,parent):
+    def __init__(self, text,parent=None):
         self.text= text
         self.parent = parent
         self.children = []
+        self._words = None
+
+    @property
+    def words(self) -> list[str]:
+        # split once; every relayout (e.g. on resize) reuses it
+        if self._words is None:
+            self._words = self.text.split()
+        return self._words
     
 class Element:
     def __init__(self, tag, parent):
@@ -29,62 +45,32 @@ class HTMLParser:
         self.finished_tags = []
 
     def parse(self):
-        in_tag = False
-        out_tag= False
-        buffer = ""
-        i = 0 
-        while i < len(self.body):
-    
-            if self.body[i] == "<":
-                if buffer:
-                        tag=  self.unfinished_tags[-1] if self.unfinished_tags else None
-                        text = Text(text=buffer,parent=tag)
-                        if tag is not None:
-                            tag.children.append(text)
-                if self.body[i]+ self.body[i+1] == "</":
-                    out_tag = True
-                    buffer =""
-                    i += 2
-                    
+        for m in _TOK_RE.finditer(self.body):
+            closing, name, text = m.groups()
+            tag = self.unfinished_tags[-1] if self.unfinished_tags else None
+            if text is not None:
+                node = Text(text=text, parent=tag)
+                if tag is not None:
+                    tag.children.append(node)
+            elif closing:
+                # innermost open tag with this name; stray closing tags are ignored
+                for i in range(len(self.unfinished_tags) - 1, -1, -1):
+                    if self.unfinished_tags[i].tag == name:
+                        finishedTag = self.unfinished_tags.pop(i)
+                        break
                 else:
-                    in_tag= True
-                    buffer =""
-                    i += 1
-            elif self.body[i] == ">" and in_tag:
-                in_tag =False
-                if buffer:
-                    tag=  self.unfinished_tags[-1] if self.unfinished_tags else None
-
-                    element = Element(tag=buffer,parent=tag)
-                    if tag is not None:
-                        
-                        tag.children.append(element)
-                    self.unfinished_tags.append(element)
-                   
-                    print("appened element on unfinished_tags: ", element.tag,  element.parent.tag if element.parent else None)
-                i += 1
-                buffer =""
-           
-            
-            elif self.body[i] == ">" and out_tag:
-                out_tag =False
-                finishedTag = [ tag for tag in self.unfinished_tags if tag.tag == buffer][0]
-                for children in finishedTag.children:
-                    print(f"parent: {buffer} => children :{children.tag if isinstance(children,Element) else children.text}")
-                self.unfinished_tags = [
-                        tag for tag in self.unfinished_tags if tag.tag != buffer
-                    ]
-
-                if buffer:
+                    continue
+                if name:
                     self.finished_tags.append(finishedTag)
-                buffer = ""
-                print("appened element on finished_tags: ", finishedTag.tag)
-                i += 1
-            else:
-                 buffer += self.body[i]
-                 i += 1
-        for tag in self.finished_tags:
-            print(f"Tag : {tag.tag}")
+                if DEBUG: print("appened element on finished_tags: ", finishedTag.tag)
+            elif name:
+                element = Element(tag=name, parent=tag)
+                if tag is not None:
+                    tag.children.append(element)
+                self.unfinished_tags.append(element)
+        if DEBUG:
+            for tag in self.finished_tags:
+                print(f"Tag : {tag.tag}")
                
 
 if __name__ == "__main__": 
@@ -103,12 +89,12 @@ if __name__ == "__main__":
        
 
 
-@dataclass
+@dataclass(slots=True)
 class Tag:
     tag: str
     attrs: dict = None
 
-@dataclass
+@dataclass(slots=True)
 class DisplayItem:
     x: int
     y: int
@@ -121,25 +107,43 @@ def lex(body):
     1. Text outside <...> is Text
     2. Text inside <...> is Tag
     Ex: "Hello <b>world</b>" -> [Text("Hello "), Tag("b"), Text("world"), Tag("/b")]
+
+    Entities are decoded per Text run, after tokenizing, so "&lt;b&gt;" stays text.
+
+    body may be a str or the raw UTF-8 bytes off the wire. Bytes are scanned
+    as they are and only each finished token is decoded; splitting on b"<"
+    and b">" is safe since those bytes never occur inside a multi-byte sequence.
     """ 
-    body = decode_entities(body)
+    if isinstance(body, (bytes, bytearray)):
+        return _scan(body, b"<", b">", _decode_utf8)
+    return _scan(body, "<", ">", str)
+
+
+def _decode_utf8(chunk) -> str:
+    return chunk.decode("utf8", errors="replace")
+
+
+def _scan(body, open_ch, close_ch, decode):
+    # jump between '<' and '>' with find() and slice; no per-character Python work.
+    # decode turns a slice into str (str itself is a no-op for a str body)
     out = []
-    buffer = ""
-    in_tag = False
-    for c in body:
-        if c == "<":
-            in_tag = True
-            if buffer: out.append(Text(buffer))
-            buffer = ""
-        elif c == ">":
-            in_tag = False
-            if buffer:
-                out.append(Tag(buffer))
-            buffer = ""
-        else:
-            buffer += c
-    if not in_tag and buffer:
-        out.append(Text(buffer))
+    append, find = out.append, body.find
+    i, n = 0, len(body)
+    while i < n:
+        lt = find(open_ch, i)
+        if lt < 0:
+            chunk = decode(body[i:])
+            append(Text(decode_entities(chunk) if "&" in chunk else chunk))
+            break
+        if lt > i:
+            chunk = decode(body[i:lt])
+            append(Text(decode_entities(chunk) if "&" in chunk else chunk))
+        gt = find(close_ch, lt + 1)
+        if gt < 0:
+            break   # unterminated tag: dropped, as before
+        if gt > lt + 1:
+            append(Tag(decode(body[lt + 1:gt])))
+        i = gt + 1
     return out
      
 FONTS = {}
@@ -153,26 +157,86 @@ def get_font(size, weight, style):
         font = tkinter.font.Font(size=size, weight=weight, slant=style)
         # Label required for proper metrics on some systems
         label = tkinter.Label(font=font)
-        FONTS[key] = (font, label)
+        # metrics never change for a font: one Tcl call, here, for its lifetime
+        FONTS[key] = (font, label, font.metrics())
 
     return FONTS[key][0]
 
+
+def get_font_metrics(size, weight, style):
+    """Cached font.metrics() dict ({'ascent', 'descent', 'linespace'}) for the font."""
+    key = (size, weight, style)
+    if key not in FONTS:
+        get_font(size, weight, style)
+    return FONTS[key][2]
+
+
+# font.measure() is a Tcl round-trip and words repeat a lot, so memoize.
+# key: (size, weight, style) -> {word: width in px}; one table per font so the
+# hot loop in Layout.shape looks up the bare word instead of building a tuple key
+MEASURE_CACHE: dict[tuple, dict[str, int]] = {}
+# key: (size, weight, style) -> width of " "
+SPACE_W_CACHE: dict[tuple, int] = {}
+
+
+def space_width(size, weight, style):
+    key = (size, weight, style)
+    w = SPACE_W_CACHE.get(key)
+    if w is None:
+        w = SPACE_W_CACHE[key] = get_font(size, weight, style).measure(" ")
+    return w
+
+
 class Layout:
   
     def __init__(self, tokens,width=WIDTH):
-        self.display_list: list [DisplayItem]= []
         self.tokens = tokens
-        self.cursor_x = HSTEP
-        self.cursor_y = VSTEP
         self.width = width
         self.weight = "normal"
         self.style = "roman"
         self.size = 12
-        self.line = []   # buffer for (x, word, font)
         self.superscript = False
         self.centering = False
-
-        self.flush()
+        # font state for the current (size, weight, style); see update_font()
+        self.current_font = None
+        self._metrics = None
+        self._space_width = 0
+        self._widths: dict[str, int] = {}
+        self.update_font()
+        # phase 1 output, built once by style_runs() and reused by every layout();
+        # _end_state is (centering, superscript) after the last tag
+        self.runs = None
+        self._end_state = (False, False)
+        self.reset()
+
+    def reset(self):
+        """Clear the display list and cursor before (re)packing the runs."""
+        # display list kept as parallel columns (SoA) rather than one object per word;
+        # y stays float because baselines are fractional (1.25 * ascent)
+        self.xs = array('i')
+        self.ys = array('d')
+        self.words: list[str] = []
+        self.fonts: list["tkinter.font.Font"] = []
+        # one entry per flushed line: index of its first word, and the
+        # smallest/largest y of its words (they differ by font ascent)
+        self.line_starts = array('i')
+        self.line_tops = array('d')
+        self.line_bottoms = array('d')
+        self.cursor_x = HSTEP
+        self.cursor_y = VSTEP
+        self.line = []   # buffer for (x, word, font, metrics)
+        # running max over self.line, kept up to date by pack_run()
+        self.line_ascent = 0
+        self.line_descent = 0
+        self.line_right = HSTEP
+
+    def update_font(self):
+        """Re-resolve the font after a tag changed size/weight/style, so the word loop only reads attributes."""
+        key = (self.size, self.weight, self.style)
+        self.current_font = get_font(*key)
+        self._metrics = get_font_metrics(*key)
+        self._space_width = space_width(*key)
+        self._widths = MEASURE_CACHE.setdefault(key, {})
 
     def flush(self):
         """
@@ -191,75 +255,107 @@ class Layout:
 
         """
         if not self.line: return
-        metrics = [ font.metrics() for x, word, font in self.line]
-      
-        max_ascent = max(m['ascent'] for m in metrics)
-        max_descent = max(m['descent'] for m in metrics)
+        max_ascent = self.line_ascent
+        max_descent = self.line_descent
          # leading = 0.25 * max_ascent
         baseline = self.cursor_y + 1.25 * max_ascent
         if self.centering:
             # compute total line width
-            total_width = self.line[-1][0] + self.line[-1][2].measure(self.line[-1][1]) - self.line[0][0]
+            total_width = self.line_right - self.line[0][0]
             # compute starting x to center the line
             offset = (self.width - total_width) // 2
         else:
             offset = 0
     
             
-        for x, word, font in self.line:
-            y = baseline - font.metrics("ascent")
-            if self.superscript:
-               y -= int(0.5 * max_ascent)
-            self.display_list.append(DisplayItem(x + offset, y, word, font))
+        # superscript shift is the same for the whole line
+        top = baseline - int(0.5 * max_ascent) if self.superscript else baseline
+        xs, ys, words, fonts = self.xs, self.ys, self.words, self.fonts
+        start = len(words)
+        for x, word, font, m in self.line:
+            xs.append(x + offset)
+            ys.append(top - m["ascent"])
+            words.append(word)
+            fonts.append(font)
+        self.line_starts.append(start)
+        self.line_tops.append(top - max_ascent)
+        self.line_bottoms.append(max(ys[start:]))
             
         self.cursor_y = baseline + 1.25 * max_descent
 
         # reset line buffer + x
         self.cursor_x = HSTEP
         self.line = []
-
-
-    def word(self, tok):
-        for word in tok.text.split():
-            font = get_font(self.size, self.weight, self.style)
+        self.line_ascent = 0
+        self.line_descent = 0
+
+
+    def display_items(self):
+        """Yield the display list as DisplayItem objects, for callers that want them."""
+        for x, y, word, font in zip(self.xs, self.ys, self.words, self.fonts):
+            yield DisplayItem(x, y, word, font)
+
+    def shape(self, tok):
+        """Phase 1 for one Text token: its words, their widths and the current style, as a run."""
+        words = tok.words
+        if not words: return
+        font, widths = self.current_font, self._widths
+        ws = []
+        append = ws.append
+        for word in words:
             # font = tkinter.font.Font(
             #         size=self.size,
             #         weight=self.weight,
             #         slant=self.style,
             #     )
             
-            w = font.measure(word)
+            # inline cache lookup: only a miss goes to Tk
+            w = widths.get(word)
+            if w is None:
+                w = widths[word] = font.measure(word)
+            append(w)
+        self.runs.append((words, ws, font, self._metrics, self._space_width,
+                          self.centering, self.superscript))
+
+    def pack_run(self, run):
+        """Phase 2 for one run: place its words on lines at self.width."""
+        words, ws, font, metrics, space_w, centering, superscript = run
+        # flush() aligns lines by these, so lines that wrap here use the run's state
+        self.centering, self.superscript = centering, superscript
+        ascent, descent = metrics["ascent"], metrics["descent"]
+        # loop-invariant state in locals; written back to self around flush()
+        max_x = self.width - HSTEP
+        append = self.line.append
+        cx, right = self.cursor_x, self.line_right
+        joined = False   # has this font been counted in the current line's max yet?
+        for word, w in zip(words, ws):
              # line wrap: flush line if needed
-            if self.cursor_x + w > self.width - HSTEP:
+            if cx + w > max_x:
+                self.cursor_x, self.line_right = cx, right
                 self.flush()
-            self.line.append((self.cursor_x, word, font))
-            self.cursor_x += w + font.measure(" ")
-
-
-    def layout(self):
+                append = self.line.append
+                cx = self.cursor_x
+                joined = False
+            if not joined:
+                self.line_ascent = max(self.line_ascent, ascent)
+                self.line_descent = max(self.line_descent, descent)
+                joined = True
+            append((cx, word, font, metrics))
+            right = cx + w   # right edge of the last word, for centering
+            cx = right + space_w
+        self.cursor_x, self.line_right = cx, right
+
+    def style_runs(self):
         """
-        ## **Pass 1 (horizontal layout):**
-
-            * measure each word
-            * compute `x` positions
-            * buffer the line
-            (do NOT compute y yet)
-
-            ---
-
-        ## **Pass 2 (vertical layout):**
-
-            * find largest ascent & descent in the line
-            * compute baseline
-            * assign final `y` for each word
-            * output display items
-                    
+        Phase 1: interpret the tags once and turn each Text token into a run
+        (words, widths, font, metrics, space width, centering, superscript).
+        None of this depends on the width, so it survives relayouts.
         """
-     
-       
+        self.runs = []
         for tok in self.tokens:
             if isinstance(tok, Text):
-                self.word(tok)
+                self.shape(tok)
+                continue
                 
             elif tok.tag == "i":
                self.style = "italic"
@@ -287,6 +383,46 @@ class Layout:
             elif tok.tag == "/sup":
                 self.size = int(self.size * 2)
                 self.superscript = False
+            else:
+                continue   # tag doesn't touch size/weight/style
+            self.update_font()
+        # the last line is flushed with the state left after the final tag
+        self._end_state = (self.centering, self.superscript)
+
+    def layout(self, width=None):
+        """
+        ## **Pass 1 (horizontal layout):**
 
-        
-        return self.display_list
\ No newline at end of file
+            * measure each word
+            * compute `x` positions
+            * buffer the line
+            (do NOT compute y yet)
+
+            ---
+
+        ## **Pass 2 (vertical layout):**
+
+            * find largest ascent & descent in the line
+            * compute baseline
+            * assign final `y` for each word
+            * output display items
+
+        Tags are interpreted and words measured only once (style_runs());
+        calling layout(width) again, e.g. on resize, just re-packs the runs.
+
+        Returns self; the display list is in xs/ys/words/fonts
+        (or display_items() for DisplayItem objects), grouped into lines
+        by line_starts/line_tops/line_bottoms.
+        """
+        if width is not None:
+            self.width = width
+        if self.runs is None:
+            self.style_runs()
+        self.reset()
+        for run in self.runs:
+            self.pack_run(run)
+
+        # the last line never wraps, so it is still sitting in the buffer
+        self.centering, self.superscript = self._end_state
+        self.flush()
+        return self
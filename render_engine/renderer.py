@@ -1,5 +1,8 @@
 import tkinter as tk
 from tkinter import ttk
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
 import os
 import tkinter.font
 from browser_engine.url import URL
@@ -11,6 +14,7 @@ import sys
 
 SCROLL_STEP = 100
 SCROLLBAR_WIDTH = 10
+RESIZE_DELAY_MS = 100
 
 """
 A browser lays out the page — determines where everything on the page goes—in terms of page coordinates 
@@ -42,7 +46,12 @@ pixel_size = 0.222 inch * 96 ≈ 21.3 px
 class Renderer:
     def __init__(self, width=WIDTH, height=HEIGHT):
         
-        self.display_list: list [DisplayItem]= []
+        self.document: Layout | None = None
+        # monotone views of the document's line extents for bisecting the visible lines (see index_display_list)
+        self._ys_max = array('d')
+        self._ys_min = array('d')
+        # page-coordinate band of words currently on the canvas (see draw)
+        self._drawn = (0.0, 0.0)
         
         self.width = width
         self.height = height
@@ -54,7 +63,14 @@ class Renderer:
         self.image_items = []          # track image create ids if needed
         self.scroll = 0
         self.tokens = [] 
-        self.images = {}               # map codepoint-> PhotoImage to keep refs
+        self.images = {}               # map codepoint-> PhotoImage to keep refs (None: no image)
+        # emoji images are looked up here, listed once: lowercased name -> file name
+        self._emoji_base_dir = os.path.dirname(os.path.abspath(__file__))
+        try:
+            self._emoji_dir = {fn.lower(): fn for fn in os.listdir(self._emoji_base_dir) if fn.lower().endswith(".png")}
+        except OSError:
+            self._emoji_dir = {}
+        self._resize_job = None        # pending after() id for the debounced relayout
 
          # Bind the Down arrow key to scrolling
         self.window.bind("<Down>", self.scrolldown)
@@ -70,10 +86,12 @@ class Renderer:
 
 
     def load(self, url):
-        text =url.fetch()
-        self.tokens = lex(text)
+        # raw body bytes: lex() scans them and decodes per token, not the whole page up front
+        body = url.fetch(decode=False)
+        self.tokens = lex(body)
         # print(f"[renderer] Lexed into {self.tokens} tokens.")
-        self.display_list = Layout(self.tokens).layout()
+        self.document = Layout(self.tokens).layout()
+        self.index_display_list()
         self.compute_document_height()
         self.draw()
     
@@ -81,14 +99,28 @@ class Renderer:
     #   COMPUTE TOTAL DOCUMENT HEIGHT
     # ------------------------------------------------------------
     def compute_document_height(self):
-        if not self.display_list:
+        if self.document is None or not self.document.ys:
             self.doc_height = 0
             return
-        last_char = self.display_list[-1]
-        self.doc_height = last_char.y + VSTEP
+        self.doc_height = self.document.ys[-1] + VSTEP
 
 
 
+    def index_display_list(self):
+        """
+        Culling works on lines, not words: one entry per line instead of
+        ~10. Line extents only grow roughly (a superscript line can start
+        above the one before), so index their running max and suffix min,
+        which are sorted and bound the visible lines exactly:
+            every line before bisect_left(_ys_max, top) is above the viewport
+            every line from bisect_right(_ys_min, bottom) on is below it
+        """
+        # packed doubles like the layout's own columns, not lists of boxed floats
+        doc = self.document
+        self._ys_max = array('d', accumulate(doc.line_bottoms, max))
+        self._ys_min = array('d', accumulate(reversed(doc.line_tops), min))
+        self._ys_min.reverse()
+
     def draw_scrollbar(self):
         self.clamp_scroll()
         if self.doc_height <= self.height:
@@ -111,7 +143,7 @@ class Renderer:
 
         self.canvas.create_rectangle(
             x0, y0, self.width, y1,
-            fill="blue", outline="black"
+            fill="blue", outline="black", tags=("scrollbar",)
         )
 
 
@@ -124,7 +156,8 @@ class Renderer:
         """
         Tries to load a PhotoImage for the emoji character ch.
         Looks for files named emoji_<HEX>.png in the same directory as this script.
-        Caches PhotoImage objects in self.images to keep them alive.
+        Caches PhotoImage objects in self.images to keep them alive, and
+        None for codepoints without an image so they are not probed again.
         """
         code = ord(ch)
         key = f"{code:X}"
@@ -137,32 +170,62 @@ class Renderer:
             f"emoji_u{key}.png",          # emoji_u1F600.png
             f"emoji_{key.lower()}.png",
         ]
-        base_dir = os.path.dirname(os.path.abspath(__file__))
+        img = None
         for name in candidates:
-            path = os.path.join(base_dir, name)
-            if os.path.isfile(path):
-                try:
-                    img = tk.PhotoImage(file=path)
-                    self.images[key] = img
-                    return img
-                except Exception:
-                    continue
-        # not found
-        return None
+            # directory was listed in __init__; only touch files that exist
+            fn = self._emoji_dir.get(name.lower())
+            if fn is None:
+                continue
+            try:
+                img = tk.PhotoImage(file=os.path.join(self._emoji_base_dir, fn))
+                break
+            except Exception:
+                continue
+        # not found -> cache None too
+        self.images[key] = img
+        return img
 
     
     # ---------------------------
     #        DRAWING
     # ---------------------------
     def draw(self):
-        """ page coordinate y then has screen coordinate y - self.scroll"""
+        """ page coordinate y then has screen coordinate y - self.scroll
+
+        Draws one extra screen above and below the viewport, so scrolling
+        can just canvas.move() the "content" items (see scroll_to).
+        """
+        self.clamp_scroll()
         self.canvas.delete("all")
         self.image_items.clear()
-        for display_item in self.display_list:
-            
+        doc = self.document
+        xs, ys, words, fonts = doc.xs, doc.ys, doc.words, doc.fonts
+        top = self.scroll - self.height - VSTEP
+        bottom = self.scroll + 2 * self.height
+        self._drawn = (top, bottom)
+        lo = bisect_left(self._ys_max, top)
+        hi = bisect_right(self._ys_min, bottom)
+        # visible lines -> the slice of words they hold
+        starts = doc.line_starts
+        first = starts[lo] if lo < len(starts) else len(words)
+        last = starts[hi] if hi < len(starts) else len(words)
+        # consecutive words on one line in one font become a single canvas item:
+        # layout already advanced x by exactly that font's space width between them
+        run_x = run_y = run_font = None
+        run_words = []
+        run_end = -1   # index of the run's last word; a skipped word breaks the run
+        # straight to Tcl: skips Canvas.create_text's kwargs -> options conversion per item,
+        # and the font goes by its Tk name (Font.name) rather than the Font object
+        call, canvas_w, scroll = self.canvas.tk.call, self.canvas._w, self.scroll
+        for i in range(first, last):
+            y = ys[i]
             #skip drawing characters that are offscreen
-            if display_item.y > self.scroll + HEIGHT: continue
-            if display_item.y + VSTEP < self.scroll: continue
+            if y > bottom or y < top: continue
+            font = fonts[i]
+            if i == run_end + 1 and y == run_y and font is run_font:
+                run_words.append(words[i])
+                run_end = i
+                continue
             # if is_emoji(c):
             #     img = self._load_emoji_image(c)
             #     if img is not None:
@@ -170,7 +233,13 @@ class Renderer:
             #         self.image_items.append(item)
             #         continue
             # # use anchor "nw" so (x,y) is top-left
-            self.canvas.create_text(display_item.x, display_item.y - self.scroll, text=display_item.word, anchor="nw",font=display_item.font)
+            if run_words:
+                call(canvas_w, "create", "text", run_x, run_y - scroll, "-text", " ".join(run_words),
+                     "-anchor", "nw", "-font", run_font.name, "-tags", "content")
+            run_x, run_y, run_font, run_words, run_end = xs[i], y, font, [words[i]], i
+        if run_words:
+            call(canvas_w, "create", "text", run_x, run_y - scroll, "-text", " ".join(run_words),
+                 "-anchor", "nw", "-font", run_font.name, "-tags", "content")
         self.draw_scrollbar()
 
     
@@ -178,31 +247,50 @@ class Renderer:
     # ---------------------------
     #  SCROLLING
     # ---------------------------
+    def scroll_to(self, scroll):
+        """Move the drawn items instead of recreating them, while the viewport stays in the drawn band."""
+        old = self.scroll
+        self.scroll = scroll
+        self.clamp_scroll()
+        top, bottom = self._drawn
+        if self.scroll - VSTEP < top or self.scroll + self.height > bottom:
+            self.draw()
+            return
+        self.canvas.move("content", 0, old - self.scroll)
+        self.canvas.delete("scrollbar")
+        self.draw_scrollbar()
+
     def scrolldown(self, event):
-        self.scroll += SCROLL_STEP
-        self.draw()
+        self.scroll_to(self.scroll + SCROLL_STEP)
     
     def scrollup(self, event):
-        self.scroll -= SCROLL_STEP
-        self.draw()
+        self.scroll_to(self.scroll - SCROLL_STEP)
     
     # Windows / macOS mouse wheel
     def on_mousewheel(self, event):
         delta = -1 * (event.delta // 120)  # normalize
-        self.scroll = max(0, self.scroll + delta * SCROLL_STEP)
-        self.draw()
+        self.scroll_to(max(0, self.scroll + delta * SCROLL_STEP))
 
 
     # ---------------------------
     #  RESIZING
     # ---------------------------
     def on_resize(self, event):
+        # <Configure> fires for every pixel of a drag; relayout once the size settles
+        if self._resize_job is not None:
+            self.window.after_cancel(self._resize_job)
+        self._resize_job = self.window.after(RESIZE_DELAY_MS, self._do_resize, event.width, event.height)
+
+    def _do_resize(self, width, height):
+        self._resize_job = None
         # Only relayout if size actually changed
-        if event.width != self.width :
-            self.width = event.width
-            self.height = event.height
+        if width != self.width :
+            self.width = width
+            self.height = height
             self.canvas.config(width=self.width, height=self.height)
-            self.display_list = Layout(self.tokens,self.width).layout()
+            # tags/word widths were worked out once in load(); only re-pack at the new width
+            self.document.layout(self.width)
+            self.index_display_list()
             self.compute_document_height()
             self.draw()
     
@@ -219,8 +307,11 @@ class Renderer:
 def main():
    
     renderer = Renderer()
-    renderer.load(URL(sys.argv[1]))
-    renderer.render()
+    try:
+        renderer.load(URL(sys.argv[1]))
+        renderer.render()
+    finally:
+        URL.shutdown()
 if __name__ == "__main__":
   
     profiler = cProfile.Profile()
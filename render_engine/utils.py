@@ -1,9 +1,40 @@
+import re
+from array import array
+from bisect import bisect_right
+
+_ENTITY_RE = re.compile(r"&(lt|gt|amp|quot|#[0-9]+|#[xX][0-9a-fA-F]+);")
+_ENTITIES = {"lt": "<", "gt": ">", "amp": "&", "quot": '"'}
+
+
+def _entity(m) -> str:
+    name = m.group(1)
+    if name[0] != "#":
+        return _ENTITIES[name]
+    # numeric: &#60; or &#x3C;
+    try:
+        cp = int(name[2:], 16) if name[1] in "xX" else int(name[1:])
+    except ValueError:
+        # too many digits for int(): certainly out of range
+        return "\ufffd"
+    # like HTML: NUL, surrogates and out-of-range code points become U+FFFD
+    # (a lone surrogate would make Tk raise when the word is measured)
+    if cp == 0 or 0xD800 <= cp <= 0xDFFF or cp > 0x10FFFF:
+        return "\ufffd"
+    return chr(cp)
+
+
 def decode_entities(text:str) -> str :
-    return text.replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
+    # one scan instead of three chained replace() passes
+    return _ENTITY_RE.sub(_entity, text)
 
 
-def is_emoji(ch: str) -> bool:
-    # very naive check: emoji are outside BMP or in emoji ranges
-    cp = ord(ch)
-    return (0x1F300 <= cp <= 0x1FAFF) or (0x1F600 <= cp <= 0x1F64F) or (0x2600 <= cp <= 0x26FF)
+# emoji ranges as sorted, disjoint [start, end) pairs flattened into one array:
+# misc symbols U+2600-26FF, and U+1F300-1FAFF (which already covers the
+# emoticons block U+1F600-1F64F)
+_EMOJI_BOUNDS = array("i", [0x2600, 0x2700, 0x1F300, 0x1FB00])
 
+
+def is_emoji(ch: str) -> bool:
+    # very naive check: emoji are outside BMP or in emoji ranges.
+    # an odd insertion point means cp fell inside a [start, end) pair
+    return bool(bisect_right(_EMOJI_BOUNDS, ord(ch)) & 1)